@@ -1,3 +1,5 @@
+import atexit
+import itertools
 import sys
 import threading
 import time
@@ -7,16 +9,19 @@ import streamlit as st
 from PIL import Image
 
 from config import (
+    CLIP_INPUT_SIZE,
     DEFAULT_DATA_DIR,
     DEFAULT_FPS,
-    DEFAULT_SIMILARITY_THRESHOLD,
+    DEFAULT_HASH_DISTANCE_THRESHOLD,
     DEFAULT_VIDEO_PATH,
+    EMBED_BATCH_SIZE,
+    EMBED_BATCH_TIMEOUT,
     IMAGE_PATH_KEY,
     IMAGES_DIR_NAME,
     QDRANT_STORAGE_DIR_NAME,
     SEARCH_LIMIT,
 )
-from glasses_x_edge.capture import VideoCapture
+from glasses_x_edge.capture import FrameWriter, VideoCapture, thumbnail_path
 from glasses_x_edge.embedding import CrossModalEncoder
 from glasses_x_edge.storage import VisionStorage
 
@@ -32,39 +37,73 @@ class SystemState:
         self.is_running = True
         self.images_dir = Path(DEFAULT_DATA_DIR) / IMAGES_DIR_NAME
         self.images_dir.mkdir(parents=True, exist_ok=True)
+        # Spread frames over 256 subdirectories to keep directory listings short
+        for bucket in range(256):
+            (self.images_dir / f"{bucket:02x}").mkdir(exist_ok=True)
+        # Seeded from the clock so a restart without a data wipe never reuses names
+        self.frame_seq = itertools.count(int(time.time() * 1000))
 
         self.storage = VisionStorage(Path(DEFAULT_DATA_DIR) / QDRANT_STORAGE_DIR_NAME)
         self.storage.initialize()
+        # Streamlit has no shutdown hook for cached resources
+        atexit.register(self.storage.close)
 
         self.encoder = CrossModalEncoder()
         self.encoder.load_models()
 
+        self.frame_writer = FrameWriter()
+
         threading.Thread(target=self.index_video_background, daemon=True).start()
 
     def index_video_background(self):
         cap = VideoCapture(str(DEFAULT_VIDEO_PATH), fps=DEFAULT_FPS)
-        last_frame = None
+        last_hash = None
+        pending, pending_since = [], 0.0
 
         with cap:
             for frame in cap.capture_continuous():
                 if not self.is_running:
                     break
 
+                # Don't let a partial batch wait for the next distinct frame
+                if pending and time.monotonic() - pending_since >= EMBED_BATCH_TIMEOUT:
+                    self.index_frames(pending)
+                    pending = []
+
                 # Skip similar frames to save space
-                if last_frame is not None:
-                    if (
-                        VideoCapture.calculate_similarity(frame, last_frame)
-                        > DEFAULT_SIMILARITY_THRESHOLD
-                    ):
+                frame_hash = VideoCapture.frame_hash(frame)
+                if last_hash is not None:
+                    distance = VideoCapture.hash_distance(last_hash, frame_hash)
+                    if distance < DEFAULT_HASH_DISTANCE_THRESHOLD:
                         continue
 
-                last_frame = frame
-                timestamp = int(time.time() * 1000)
-                image_path = self.images_dir / f"frame_{timestamp}.jpg"
+                last_hash = frame_hash
+                image_path = self.next_image_path()
+
+                if not pending:
+                    pending_since = time.monotonic()
+                pending.append((image_path, frame))
+                if len(pending) >= EMBED_BATCH_SIZE:
+                    self.index_frames(pending)
+                    pending = []
+
+            if pending:
+                self.index_frames(pending)
+
+    def next_image_path(self) -> Path:
+        seq = next(self.frame_seq)
+        return self.images_dir / f"{seq & 0xFF:02x}" / f"{seq:013d}.jpg"
+
+    def index_frames(self, frames):
+        for image_path, frame in frames:
+            self.frame_writer.put(frame, image_path)
 
-                cap.save_frame(frame, image_path)
-                embedding = self.encoder.encode_image(image_path)
-                self.storage.store_image(image_path, embedding)
+        # Embed the decoded frames directly instead of re-reading the JPEGs
+        images = [VideoCapture.to_image(frame, CLIP_INPUT_SIZE) for _, frame in frames]
+        embeddings = self.encoder.encode_images(images)
+        self.storage.store_images(
+            [path for path, _ in frames], embeddings, timestamp=time.time()
+        )
 
 
 @st.cache_resource
@@ -72,6 +111,23 @@ def get_system_state():
     return SystemState()
 
 
+@st.cache_data(show_spinner=False, max_entries=128)
+def load_image(path: str, mtime: float) -> Image.Image:
+    # mtime is part of the cache key so a rewritten file is decoded again
+    with Image.open(path) as image:
+        return image.copy()
+
+
+def load_result_image(image_path: Path) -> Image.Image | None:
+    # Prefer the thumbnail, fall back to the full frame
+    for path in (thumbnail_path(image_path), image_path):
+        try:
+            return load_image(str(path), path.stat().st_mtime)
+        except OSError:  # Not written yet, or unreadable
+            continue
+    return None
+
+
 @st.fragment
 def render_search_interface(system):
     st.header("Smart 🕶️ X Qdrant Edge")
@@ -87,11 +143,11 @@ def render_search_interface(system):
             return
 
         for result in results:
-            image_path = Path(result[IMAGE_PATH_KEY])
-            st.image(
-                Image.open(image_path),
-                width="stretch",
-            )
+            image = load_result_image(Path(result[IMAGE_PATH_KEY]))
+            if image is None:
+                st.info("This frame is still being saved.")
+                continue
+            st.image(image, width="stretch")
 
 
 @st.fragment(run_every=2)
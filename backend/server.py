@@ -1,11 +1,16 @@
+import base64
+import json
+import struct
 from contextlib import asynccontextmanager
 from typing import Any
 
 import httpx
+import numpy as np
 from fastapi import APIRouter, FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from qdrant_client import QdrantClient, models
+from starlette.background import BackgroundTask
 from starlette.middleware.base import BaseHTTPMiddleware
 
 from config import (
@@ -14,23 +19,36 @@ from config import (
     BACKEND_PORT,
     COLLECTION_NAME,
     DISTANCE_METRIC,
+    QDRANT_GRPC_PORT,
     QDRANT_URL,
+    SNAPSHOT_CHUNK_SIZE,
     VALID_API_KEYS,
     VECTOR_DIMENSION,
 )
 
 
+def dequantize(codes: np.ndarray, scale, offset) -> np.ndarray:
+    return (codes.astype(np.float32) + 128) * scale + offset
+
+
 class Point(BaseModel):
-    id: str
-    vector: list[float]
+    id: int | str
+    vector: str  # base64-encoded int8 codes
+    scale: float
+    offset: float
     payload: dict[str, Any]
 
+    def dequantize(self) -> list[float]:
+        codes = np.frombuffer(base64.b64decode(self.vector), dtype=np.int8)
+        return dequantize(codes, self.scale, self.offset).tolist()
+
 
 class SnapshotManifest(BaseModel):
     manifest: dict[str, Any]
 
 
-qdrant = QdrantClient(url=QDRANT_URL)
+# Points travel as binary protobuf over gRPC; snapshots still use the REST API
+qdrant = QdrantClient(url=QDRANT_URL, prefer_grpc=True, grpc_port=QDRANT_GRPC_PORT)
 
 
 class AuthMiddleware(BaseHTTPMiddleware):
@@ -41,18 +59,45 @@ class AuthMiddleware(BaseHTTPMiddleware):
         return await call_next(request)
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
+def collection_matches() -> bool:
+    if not qdrant.collection_exists(COLLECTION_NAME):
+        return False
+    params = qdrant.get_collection(COLLECTION_NAME).config.params.vectors
+    return (
+        isinstance(params, models.VectorParams)
+        and params.size == VECTOR_DIMENSION
+        and params.distance == DISTANCE_METRIC
+    )
+
+
+def recreate_collection():
     if qdrant.collection_exists(COLLECTION_NAME):
         qdrant.delete_collection(COLLECTION_NAME)
 
     qdrant.create_collection(
         collection_name=COLLECTION_NAME,
-        vectors_config=models.VectorParams(
-            size=VECTOR_DIMENSION, distance=DISTANCE_METRIC
-        ),
+        vectors_config=models.VectorParams(size=VECTOR_DIMENSION, distance=DISTANCE_METRIC),
     )
-    yield
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep existing data across restarts; only a config change forces a rebuild.
+    # An edge starting from empty storage clears it through /api/reset.
+    if not collection_matches():
+        recreate_collection()
+
+    # One pooled client for all snapshot traffic instead of a connection per call.
+    # Snapshots are forwarded as raw bytes without their Content-Encoding, so
+    # Qdrant must not compress them on this hop.
+    async with httpx.AsyncClient(
+        base_url=QDRANT_URL,
+        headers={"Accept-Encoding": "identity"},
+        timeout=None,
+        limits=httpx.Limits(max_keepalive_connections=16),
+    ) as client:
+        app.state.qdrant_http = client
+        yield
 
 
 app = FastAPI(title="Qdrant Edge Demo Backend", lifespan=lifespan)
@@ -60,46 +105,161 @@ app.add_middleware(AuthMiddleware)
 api = APIRouter(prefix="/api")
 
 
+@api.post("/reset")
+async def reset_collection():
+    """Drop all uploaded points, for an edge that starts over with empty
+    storage and would otherwise re-upload its frames under new ids."""
+    recreate_collection()
+    return {"status": "ok"}
+
+
 @api.post("/upsert")
 async def upsert_points(points: list[Point]):
-    qdrant_points = [
-        models.PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points
-    ]
-    qdrant.upsert(collection_name=COLLECTION_NAME, points=qdrant_points, wait=True)
-    return {"status": "ok", "count": len(qdrant_points)}
+    qdrant.upsert(
+        collection_name=COLLECTION_NAME,
+        points=models.Batch.model_construct(
+            ids=[p.id for p in points],
+            vectors=[p.dequantize() for p in points],
+            payloads=[p.payload for p in points],
+        ),
+        wait=True,
+    )
+    return {"status": "ok", "count": len(points)}
 
 
-@api.post("/snapshots/full")
-async def create_full_snapshot(shard_id: int = 0):
-    snap_url = f"{QDRANT_URL}/collections/{COLLECTION_NAME}/shards/{shard_id}/snapshots"
+def is_point_id(value) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return 0 <= value < 2**64
+    return isinstance(value, str)
+
 
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(snap_url)
-        resp.raise_for_status()
-        result = resp.json().get("result", {})
-        snapshot_name = result.get("name")
-        if not snapshot_name:
-            raise HTTPException(500, "Failed to create snapshot")
+@api.post("/upsert_bin")
+async def upsert_points_binary(request: Request):
+    """Binary variant of /upsert: a little-endian uint32 header length, a JSON
+    header (dtype, dim, ids, scales, offsets, payloads), then the int8 codes
+    of all points back to back."""
+    body = await request.body()
+    if len(body) < 4:
+        raise HTTPException(400, "Body too short for a header length")
+    (header_size,) = struct.unpack_from("<I", body)
+    if 4 + header_size > len(body):
+        raise HTTPException(400, "Header length exceeds body size")
+    try:
+        header = json.loads(body[4 : 4 + header_size])
+        dtype, dim = header.get("dtype"), int(header["dim"])
+        ids, payloads = list(header["ids"]), list(header["payloads"])
+        scales = np.asarray(header["scales"], dtype=np.float32)
+        offsets = np.asarray(header["offsets"], dtype=np.float32)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise HTTPException(400, f"Invalid header: {e}")
+    if dtype != "int8":
+        raise HTTPException(400, f"Unsupported dtype: {dtype}")
+    if dim != VECTOR_DIMENSION:
+        raise HTTPException(400, f"Expected dim {VECTOR_DIMENSION}, got {dim}")
+    # model_construct below skips pydantic, so check what Qdrant would reject
+    if not all(is_point_id(point_id) for point_id in ids):
+        raise HTTPException(400, "Point ids must be unsigned 64-bit integers or strings")
+    if not all(isinstance(payload, dict) for payload in payloads):
+        raise HTTPException(400, "Payloads must be objects")
+
+    codes = np.frombuffer(body, dtype=np.int8, offset=4 + header_size)
+    if len(codes) % dim:
+        raise HTTPException(400, "Vector data does not match header dim")
+    codes = codes.reshape(-1, dim)
+    if not len(codes) == len(ids) == len(payloads) == scales.size == offsets.size:
+        raise HTTPException(400, "Vector count does not match header")
+
+    vectors = dequantize(codes, scales.reshape(-1, 1), offsets.reshape(-1, 1))
+    qdrant.upsert(
+        collection_name=COLLECTION_NAME,
+        # Built from already-validated data: skip pydantic re-validating every float
+        points=models.Batch.model_construct(
+            ids=ids, vectors=vectors.tolist(), payloads=payloads
+        ),
+        wait=True,
+    )
+    return {"status": "ok", "count": len(codes)}
+
+
+def shard_snapshots_url(shard_id: int) -> str:
+    return f"/collections/{COLLECTION_NAME}/shards/{shard_id}/snapshots"
+
+
+async def create_shard_snapshot(client: httpx.AsyncClient, shard_id: int) -> str:
+    resp = await client.post(shard_snapshots_url(shard_id))
+    resp.raise_for_status()
+    result = resp.json().get("result", {})
+    snapshot_name = result.get("name")
+    if not snapshot_name:
+        raise HTTPException(500, "Failed to create snapshot")
+    return snapshot_name
+
+
+@api.post("/snapshots/full")
+async def create_full_snapshot(request: Request, shard_id: int = 0):
+    client = request.app.state.qdrant_http
+    snap_url = shard_snapshots_url(shard_id)
+    snapshot_name = await create_shard_snapshot(client, shard_id)
 
     async def stream():
-        async with httpx.AsyncClient() as client:
-            async with client.stream("GET", f"{snap_url}/{snapshot_name}") as r:
-                async for chunk in r.aiter_bytes(8192):
-                    yield chunk
+        async with client.stream("GET", f"{snap_url}/{snapshot_name}") as r:
+            async for chunk in r.aiter_raw(SNAPSHOT_CHUNK_SIZE):
+                yield chunk
 
     return StreamingResponse(stream(), media_type="application/octet-stream")
 
 
+@api.post("/snapshots/full/create")
+async def create_named_full_snapshot(request: Request, shard_id: int = 0):
+    """Create a full snapshot without downloading it, so the client can fetch
+    it from /snapshots/full/{name} in parallel byte ranges."""
+    name = await create_shard_snapshot(request.app.state.qdrant_http, shard_id)
+    return {"name": name}
+
+
+@api.get("/snapshots/full/{snapshot_name}")
+async def download_full_snapshot(request: Request, snapshot_name: str, shard_id: int = 0):
+    client = request.app.state.qdrant_http
+    headers = {}
+    if "range" in request.headers:
+        headers["Range"] = request.headers["range"]
+
+    upstream = await client.send(
+        client.build_request(
+            "GET", f"{shard_snapshots_url(shard_id)}/{snapshot_name}", headers=headers
+        ),
+        stream=True,
+    )
+    if upstream.status_code >= 400:
+        await upstream.aclose()
+        raise HTTPException(upstream.status_code, "Failed to download snapshot")
+
+    # Pass the range response through as-is: 206 with Content-Range if Qdrant
+    # honoured the Range header, a plain 200 otherwise
+    passthrough = ("content-length", "content-range", "accept-ranges")
+    return StreamingResponse(
+        upstream.aiter_raw(SNAPSHOT_CHUNK_SIZE),
+        status_code=upstream.status_code,
+        headers={k: v for k, v in upstream.headers.items() if k in passthrough},
+        media_type="application/octet-stream",
+        background=BackgroundTask(upstream.aclose),
+    )
+
+
 @api.post("/snapshots/partial")
-async def create_partial_snapshot(request: SnapshotManifest, shard_id: int = 0):
-    url = f"{QDRANT_URL}/collections/{COLLECTION_NAME}/shards/{shard_id}/snapshot/partial/create"
+async def create_partial_snapshot(
+    snapshot: SnapshotManifest, request: Request, shard_id: int = 0
+):
+    client = request.app.state.qdrant_http
+    url = f"/collections/{COLLECTION_NAME}/shards/{shard_id}/snapshot/partial/create"
 
     async def stream():
-        async with httpx.AsyncClient() as client:
-            async with client.stream("POST", url, json=request.manifest) as r:
-                r.raise_for_status()
-                async for chunk in r.aiter_bytes(8192):
-                    yield chunk
+        async with client.stream("POST", url, json=snapshot.manifest) as r:
+            r.raise_for_status()
+            async for chunk in r.aiter_raw(SNAPSHOT_CHUNK_SIZE):
+                yield chunk
 
     return StreamingResponse(stream(), media_type="application/octet-stream")
 
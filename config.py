@@ -12,9 +12,10 @@ BACKEND_HOST = "0.0.0.0"
 BACKEND_PORT = 8000
 BACKEND_URL = "http://localhost:8000"
 QDRANT_URL = "http://localhost:6333"
+QDRANT_GRPC_PORT = 6334
 VALID_API_KEYS = ["demo-api-key"]
 COLLECTION_NAME = "smart_glasses"
-DISTANCE_METRIC = Distance.COSINE
+DISTANCE_METRIC = Distance.DOT  # NOTE: Embeddings are L2-normalized by the encoders
 
 # EDGE CONFIG
 PROJECT_ROOT = Path(__file__).parent.absolute()
@@ -26,19 +27,29 @@ MUTABLE_SHARD_DIR = "mutable"
 IMMUTABLE_SHARD_DIR = "immutable"
 DEFAULT_FPS = 1.0
 JPEG_QUALITY = 70
-DEFAULT_SIMILARITY_THRESHOLD = 0.75
+JPEG_WRITER_QUEUE_SIZE = 32
+THUMBNAIL_SIZE = 256  # px, longest side
+EMBED_BATCH_SIZE = 8
+EMBED_BATCH_TIMEOUT = 2.0  # seconds
+DEFAULT_HASH_DISTANCE_THRESHOLD = 6  # NOTE: Hamming distance (0-64) under which frames are duplicates
 VISION_MODEL_NAME = (
     "Qdrant/clip-ViT-B-32-vision"  # NOTE: Also update Makefile if changed
 )
 TEXT_MODEL_NAME = "Qdrant/clip-ViT-B-32-text"  # NOTE: Also update Makefile if changed
 MODELS_CACHE_DIR = PROJECT_ROOT / "models"
+QUANTIZED_MODELS_DIR = MODELS_CACHE_DIR / "int8"  # NOTE: Filled by `make quantize`
+CLIP_INPUT_SIZE = 224  # NOTE: Shortest side the CLIP preprocessor resizes to
 SEARCH_LIMIT = 3
 MMR_DIVERSITY_FACTOR = 0.8 # NOTE:  0.0 (Pure Diversity) to 1.0 (Pure Relevance)
 MMR_MAX_CANDIDATES = 100
+MMR_OVERFETCH = 20 # MMR candidates fetched per requested result, capped at MMR_MAX_CANDIDATES
 SYNC_INTERVAL = 5  # seconds
-SNAPSHOT_CHUNK_SIZE = 8192  # bytes
-DISTANCE_METRIC_EDGE = EdgeDistance.Cosine
+UPLOAD_BATCH_SIZE = 256
+SNAPSHOT_CHUNK_SIZE = 1 << 20  # bytes
+SNAPSHOT_DOWNLOAD_WORKERS = 4  # parallel byte-range requests per snapshot download
+DISTANCE_METRIC_EDGE = EdgeDistance.Dot
 QUEUE_DB_NAME = "upload_queue"
+SERVER_RESET_MARKER = "server_reset_pending"  # NOTE: Edge storage was wiped, clear the server before uploading
 SYNC_TIMESTAMP_KEY = "sync_timestamp"
 IMAGE_PATH_KEY = "image_path"
 API_KEY = "demo-api-key"
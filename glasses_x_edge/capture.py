@@ -1,20 +1,34 @@
 import logging
+import os
+import queue
+import threading
 import time
 from pathlib import Path
 
 import cv2
 import numpy as np
 from PIL import Image
-from skimage.metrics import structural_similarity
 
-from config import JPEG_QUALITY
+from config import JPEG_QUALITY, JPEG_WRITER_QUEUE_SIZE, THUMBNAIL_SIZE
 
-FRAME_RESIZE_TARGET = (128, 128)
-SSIM_DATA_RANGE = 255
+JPEG_PARAMS = [
+    cv2.IMWRITE_JPEG_QUALITY,
+    JPEG_QUALITY,
+    # Baseline, single-pass encoding: no extra Huffman optimization pass
+    cv2.IMWRITE_JPEG_OPTIMIZE,
+    0,
+    cv2.IMWRITE_JPEG_PROGRESSIVE,
+    0,
+]
+HASH_SIZE = (9, 8)  # (width, height): 8 horizontal gradients per row -> 64 bits
 
 logger = logging.getLogger(__name__)
 
 
+def thumbnail_path(image_path: Path) -> Path:
+    return image_path.with_suffix(".thumb.jpg")
+
+
 class VideoCapture:
     def __init__(self, source: str, fps: float):
         self.source = source
@@ -44,34 +58,91 @@ class VideoCapture:
         video_fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
         frames_to_skip = max(1, int(video_fps * self.frame_interval))
 
-        frame_count = 0
+        frame_index = 0
         while True:
-            ret, frame = self.capture.read()
-            if not ret:
+            # grab() skips the YUV->BGR conversion, only retrieve() the frames we keep
+            if not self.capture.grab():
                 break
 
-            frame_count += 1
-            if frame_count % frames_to_skip == 1:
+            if frame_index % frames_to_skip == 0:
+                ret, frame = self.capture.retrieve()
+                if not ret:
+                    break
                 yield frame
                 time.sleep(self.frame_interval)
 
+            frame_index += 1
+
     @staticmethod
-    def calculate_similarity(frame1: np.ndarray, frame2: np.ndarray) -> float:
-        if frame1 is None or frame2 is None:
-            return 0.0
+    def frame_hash(frame: np.ndarray) -> int:
+        """64-bit difference hash (dHash) of a BGR frame."""
+        # Area averaging over a grayscale frame, as standard for dHash: each of
+        # the 72 cells averages its whole block, so sensor noise on single
+        # pixels doesn't flip bits
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, HASH_SIZE, interpolation=cv2.INTER_AREA)
+        bits = small[:, 1:] > small[:, :-1]
+        return int(np.packbits(bits).view(np.uint64)[0])
 
-        f1 = cv2.resize(frame1, FRAME_RESIZE_TARGET)
-        f2 = cv2.resize(frame2, FRAME_RESIZE_TARGET)
+    @staticmethod
+    def hash_distance(hash1: int, hash2: int) -> int:
+        return (hash1 ^ hash2).bit_count()
 
-        g1 = cv2.cvtColor(f1, cv2.COLOR_BGR2GRAY)
-        g2 = cv2.cvtColor(f2, cv2.COLOR_BGR2GRAY)
+    @staticmethod
+    def to_image(frame: np.ndarray, min_side: int | None = None) -> Image.Image:
+        """RGB image of a BGR frame, optionally shrunk so its shortest side is
+        `min_side` (aspect ratio kept)."""
+        if min_side is not None:
+            scale = min_side / min(frame.shape[:2])
+            if scale < 1:
+                frame = cv2.resize(
+                    frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+                )
+        return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
 
-        score = structural_similarity(g1, g2, data_range=SSIM_DATA_RANGE)
-        return float(score)
+    @staticmethod
+    def thumbnail(frame: np.ndarray, size: int = THUMBNAIL_SIZE) -> np.ndarray:
+        scale = size / max(frame.shape[:2])
+        if scale >= 1:
+            return frame
+        return cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
 
-    def save_frame(self, frame: np.ndarray, output_path: Path) -> Path:
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        image = Image.fromarray(rgb_frame)
-        image.save(output_path, "JPEG", quality=JPEG_QUALITY)
+    @staticmethod
+    def save_frame(frame: np.ndarray, output_path: Path) -> Path:
+        # OpenCV encodes straight from BGR, no RGB copy needed
+        ok, buffer = cv2.imencode(".jpg", frame, JPEG_PARAMS)
+        if not ok:
+            raise RuntimeError(f"Failed to encode frame: {output_path}")
+
+        # Write under a temporary name and rename, so readers never see a
+        # half-written JPEG
+        temp_path = output_path.with_name(output_path.name + ".tmp")
+        temp_path.write_bytes(buffer)
+        os.replace(temp_path, output_path)
         return output_path
+
+
+class FrameWriter:
+    """Saves frames and their display thumbnails as JPEG on a background
+    thread, off the indexing path."""
+
+    def __init__(self, maxsize: int = JPEG_WRITER_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, frame: np.ndarray, output_path: Path):
+        self.queue.put((frame, output_path))
+
+    def _run(self):
+        while True:
+            frame, output_path = self.queue.get()
+            try:
+                VideoCapture.save_frame(frame, output_path)
+                VideoCapture.save_frame(
+                    VideoCapture.thumbnail(frame), thumbnail_path(output_path)
+                )
+            except Exception:
+                logger.exception(f"Failed to save frame: {output_path}")
+            finally:
+                self.queue.task_done()
@@ -1,14 +1,47 @@
 import logging
 from pathlib import Path
 
+import numpy as np
 from fastembed import ImageEmbedding
 from PIL import Image
 
-from config import MODELS_CACHE_DIR, TEXT_MODEL_NAME, VISION_MODEL_NAME
+from config import (
+    MODELS_CACHE_DIR,
+    QUANTIZED_MODELS_DIR,
+    TEXT_MODEL_NAME,
+    VISION_MODEL_NAME,
+)
+
+ONNX_PROVIDERS = ["CPUExecutionProvider"]
 
 logger = logging.getLogger(__name__)
 
 
+def quantized_model_dir(model_name: str) -> Path:
+    return QUANTIZED_MODELS_DIR / model_name.replace("/", "--")
+
+
+def model_options(model_name: str) -> dict:
+    """Loader options, preferring the int8 copy from `make quantize` if present."""
+    options = {
+        "model_name": model_name,
+        "cache_dir": str(MODELS_CACHE_DIR),
+        "providers": ONNX_PROVIDERS,
+    }
+    model_dir = quantized_model_dir(model_name)
+    if model_dir.exists():
+        logger.info(f"Using int8 quantized model: {model_dir}")
+        options["specific_model_path"] = str(model_dir)
+    return options
+
+
+def normalize(vector: np.ndarray) -> np.ndarray:
+    """L2-normalize once so similarity search can use a plain dot product."""
+    vector = vector.astype(np.float32)
+    vector /= np.linalg.norm(vector) + 1e-12
+    return vector
+
+
 class ImageEncoder:
     def __init__(self):
         self.model = None
@@ -16,19 +49,20 @@ class ImageEncoder:
     def load_model(self):
         if self.model is None:
             logger.info(f"Loading image embedding model: {VISION_MODEL_NAME}")
-            self.model = ImageEmbedding(
-                model_name=VISION_MODEL_NAME, cache_dir=str(MODELS_CACHE_DIR)
-            )
+            self.model = ImageEmbedding(**model_options(VISION_MODEL_NAME))
 
     def encode_image(self, image):
+        return self.encode_images([image])[0]
+
+    def encode_images(self, images: list) -> list[np.ndarray]:
         if self.model is None:
             self.load_model()
 
-        if isinstance(image, (str, Path)):
-            image = Image.open(image)
-
-        embeddings = list(self.model.embed([image]))
-        return embeddings[0]
+        images = [
+            Image.open(image) if isinstance(image, (str, Path)) else image
+            for image in images
+        ]
+        return [normalize(embedding) for embedding in self.model.embed(images)]
 
 
 class TextEncoder:
@@ -40,16 +74,14 @@ class TextEncoder:
             from fastembed import TextEmbedding
 
             logger.info(f"Loading text embedding model: {TEXT_MODEL_NAME}")
-            self.model = TextEmbedding(
-                model_name=TEXT_MODEL_NAME, cache_dir=str(MODELS_CACHE_DIR)
-            )
+            self.model = TextEmbedding(**model_options(TEXT_MODEL_NAME))
 
     def encode_text(self, text: str):
         if self.model is None:
             self.load_model()
 
         embeddings = list(self.model.embed([text]))
-        return embeddings[0]
+        return normalize(embeddings[0])
 
 
 class CrossModalEncoder:
@@ -60,6 +92,9 @@ class CrossModalEncoder:
     def encode_image(self, image):
         return self.image_encoder.encode_image(image)
 
+    def encode_images(self, images: list) -> list[np.ndarray]:
+        return self.image_encoder.encode_images(images)
+
     def encode_text(self, text: str):
         return self.text_encoder.encode_text(text)
 
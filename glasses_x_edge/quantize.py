@@ -0,0 +1,59 @@
+"""Dynamic int8 quantization of the downloaded CLIP models.
+
+Run with `make quantize` after `make setup`. The encoders pick up the
+quantized copies automatically once they exist.
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+import onnxruntime as ort
+from onnxruntime.quantization import QuantType, quantize_dynamic
+
+from config import MODELS_CACHE_DIR, TEXT_MODEL_NAME, VISION_MODEL_NAME
+
+from .embedding import ONNX_PROVIDERS, quantized_model_dir
+
+MODEL_FILE = "model.onnx"
+# ONNX Runtime's CPU provider has no int8 ConvInteger kernel, so the vision
+# model's Conv patch embedding stays float; the transformer layers are matmuls
+QUANTIZED_OP_TYPES = ["MatMul", "Gemm"]
+
+
+def quantize_model(model_name: str):
+    # fastembed stores models in the Hugging Face hub cache layout
+    cache_name = f"models--{model_name.replace('/', '--')}"
+    sources = sorted(MODELS_CACHE_DIR.glob(f"{cache_name}/snapshots/*/{MODEL_FILE}"))
+    if not sources:
+        raise FileNotFoundError(f"Model not downloaded, run `make setup`: {model_name}")
+
+    source_dir = sources[-1].parent
+    target_dir = quantized_model_dir(model_name)
+    target_dir.parent.mkdir(parents=True, exist_ok=True)
+
+    # The encoders use the int8 copy as soon as its directory exists, so build
+    # and check it elsewhere and only move it into place once it loads
+    with tempfile.TemporaryDirectory(dir=target_dir.parent) as temp_dir:
+        build_dir = Path(temp_dir) / "model"
+        shutil.copytree(source_dir, build_dir, ignore=shutil.ignore_patterns(MODEL_FILE))
+        quantize_dynamic(
+            str(source_dir / MODEL_FILE),
+            str(build_dir / MODEL_FILE),
+            op_types_to_quantize=QUANTIZED_OP_TYPES,
+            weight_type=QuantType.QInt8,
+        )
+        try:
+            ort.InferenceSession(str(build_dir / MODEL_FILE), providers=ONNX_PROVIDERS)
+        except Exception as e:
+            raise RuntimeError(f"Quantized {model_name} does not load, not installing it") from e
+
+        if target_dir.exists():
+            shutil.rmtree(target_dir)
+        build_dir.replace(target_dir)
+
+
+if __name__ == "__main__":
+    for name in (VISION_MODEL_NAME, TEXT_MODEL_NAME):
+        quantize_model(name)
+        print(f"Quantized {name}")
@@ -1,11 +1,142 @@
+import pickle
+import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
+from queue import Empty
 
-from persistqueue import SQLiteAckQueue
+READY = 0
+UNACKED = 1
+MMAP_SIZE = 64 * 1024 * 1024
 
 
-def create_persistent_queue(db_path: Path) -> SQLiteAckQueue:
-    return SQLiteAckQueue(
-        path=str(db_path),
-        auto_commit=True,
-        multithreading=True,
-    )
+class PersistentQueue:
+    """SQLite-backed acknowledgement queue.
+
+    Items are handed out by `get` as (row id, item) pairs and stay on disk
+    until their row id is acked; `nack` puts them back in their original
+    position. The database runs in WAL mode with
+    synchronous=NORMAL, so commits don't wait for an fsync: the queue survives
+    process crashes and only the last few writes are at risk on power loss.
+    """
+
+    def __init__(self, db_path: Path):
+        db_path.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(db_path / "data.db"), check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS queue "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, data BLOB NOT NULL, status INTEGER NOT NULL)"
+        )
+        # Items that were in flight when the process stopped are handed out again
+        self._conn.execute("UPDATE queue SET status = ? WHERE status = ?", (READY, UNACKED))
+
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._interrupted = False
+        self.size = self._conn.execute(
+            "SELECT COUNT(*) FROM queue WHERE status = ?", (READY,)
+        ).fetchone()[0]
+
+    def put(self, item):
+        data = pickle.dumps(item)
+        with self._not_empty:
+            self._conn.execute("INSERT INTO queue (data, status) VALUES (?, ?)", (data, READY))
+            self._grow(1)
+
+    def put_many(self, items: list):
+        rows = [(pickle.dumps(item), READY) for item in items]
+        with self._not_empty, self._transaction():
+            self._conn.executemany("INSERT INTO queue (data, status) VALUES (?, ?)", rows)
+            self._grow(len(rows))
+
+    def get(self, block: bool = True, timeout: float | None = None) -> tuple[int, object]:
+        entries = self.get_many(1, block, timeout)
+        if not entries:
+            raise Empty
+        return entries[0]
+
+    def get_many(self, count: int, block: bool = True, timeout: float | None = None) -> list:
+        """Take up to `count` (row id, item) pairs in one transaction, waiting
+        for the first one like `get`. Returns an empty list instead of raising
+        Empty, also when `interrupt` cuts the wait short."""
+        with self._not_empty:
+            self._not_empty.wait_for(
+                lambda: self.size > 0 or self._interrupted, timeout if block else 0
+            )
+            if self.size == 0:
+                return []
+
+            rows = self._conn.execute(
+                "SELECT id, data FROM queue WHERE status = ? ORDER BY id LIMIT ?", (READY, count)
+            ).fetchall()
+            with self._transaction():
+                self._conn.executemany(
+                    "UPDATE queue SET status = ? WHERE id = ?",
+                    [(UNACKED, row_id) for row_id, _ in rows],
+                )
+            self.size -= len(rows)
+
+        return [(row_id, pickle.loads(data)) for row_id, data in rows]
+
+    def ack(self, row_id: int):
+        self.ack_many([row_id])
+
+    def ack_many(self, row_ids: list[int]):
+        """Remove delivered items from disk in a single statement."""
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM queue WHERE id IN ({', '.join('?' * len(row_ids))})", row_ids
+            )
+
+    def nack(self, row_id: int):
+        self.nack_many([row_id])
+
+    def nack_many(self, row_ids: list[int]):
+        """Hand items back for redelivery, keeping their original order."""
+        with self._not_empty:
+            # Only rows that are actually in flight count towards the size
+            cursor = self._conn.execute(
+                f"UPDATE queue SET status = ? "
+                f"WHERE status = ? AND id IN ({', '.join('?' * len(row_ids))})",
+                [READY, UNACKED, *row_ids],
+            )
+            self._grow(cursor.rowcount)
+
+    def interrupt(self):
+        """Wake blocked consumers and make blocking gets return at once until
+        `resume` is called."""
+        with self._not_empty:
+            self._interrupted = True
+            self._not_empty.notify_all()
+
+    def resume(self):
+        with self._lock:
+            self._interrupted = False
+
+    def _grow(self, count: int):
+        # Consumers only ever wait on an empty queue, so only wake them on the
+        # empty -> non-empty transition. Caller holds the lock.
+        was_empty = self.size == 0
+        self.size += count
+        if was_empty:
+            self._not_empty.notify_all()
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+
+def create_persistent_queue(db_path: Path) -> PersistentQueue:
+    return PersistentQueue(db_path)
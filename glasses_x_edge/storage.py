@@ -1,11 +1,20 @@
+import json
+import logging
+import os
 import shutil
+import struct
 import tempfile
 import threading
 import time
 import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 
+import numpy as np
 import requests
+import urllib3
 from qdrant_edge import (
     EdgeConfig,
     EdgeShard,
@@ -13,11 +22,14 @@ from qdrant_edge import (
     Filter,
     Mmr,
     Point,
+    Query,
     QueryRequest,
     RangeFloat,
     UpdateOperation,
     VectorDataConfig,
 )
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 from config import (
     API_KEY,
@@ -28,22 +40,102 @@ from config import (
     IMMUTABLE_SHARD_DIR,
     MMR_DIVERSITY_FACTOR,
     MMR_MAX_CANDIDATES,
+    MMR_OVERFETCH,
     MUTABLE_SHARD_DIR,
     QUEUE_DB_NAME,
     SEARCH_LIMIT,
+    SERVER_RESET_MARKER,
     SNAPSHOT_CHUNK_SIZE,
+    SNAPSHOT_DOWNLOAD_WORKERS,
     SYNC_INTERVAL,
     SYNC_TIMESTAMP_KEY,
+    UPLOAD_BATCH_SIZE,
     VECTOR_DIMENSION,
 )
 
 from .queue import create_persistent_queue
 
 HEADERS = {API_KEY_HEADER: API_KEY}
+FULL_SNAPSHOT_ENDPOINT = "/api/snapshots/full"
+UPSERT_ENDPOINT = "/api/upsert_bin"
+# Holding dirs of replaced immutable shards, deleted in the background
+RETIRED_SHARD_PREFIX = "immutable.old-"
 SHARD_CONFIG = EdgeConfig(
     vector_data=VectorDataConfig(size=VECTOR_DIMENSION, distance=DISTANCE_METRIC_EDGE)
 )
 
+logger = logging.getLogger(__name__)
+
+
+def prepare_vector(embedding) -> tuple[np.ndarray, list]:
+    """Convert an embedding to contiguous float32 once and check its size.
+    Returns the array and the list form the shard takes."""
+    vector = np.ascontiguousarray(embedding, dtype=np.float32).reshape(-1)
+    if vector.shape[0] != VECTOR_DIMENSION:
+        raise ValueError(
+            f"Expected a {VECTOR_DIMENSION}-dimensional embedding, got {vector.shape[0]}"
+        )
+    return vector, vector.tolist()
+
+
+def quantize_vector(vector: np.ndarray) -> dict:
+    """Min/max scalar quantization to int8 for upload, undone by the backend."""
+    low, high = float(vector.min()), float(vector.max())
+    scale = (high - low) / 255 or 1.0
+    codes = np.round((vector - low) / scale - 128).astype(np.int8)
+    return {"vector": codes.tobytes(), "scale": scale, "offset": low}
+
+
+def encode_batch(items: list) -> bytes:
+    """Pack queued points into the /api/upsert_bin body: a little-endian
+    uint32 header length, the JSON header, then all int8 codes back to back."""
+    header = json.dumps(
+        {
+            "dtype": "int8",
+            "dim": VECTOR_DIMENSION,
+            "ids": [item["id"] for item in items],
+            "scales": [item["scale"] for item in items],
+            "offsets": [item["offset"] for item in items],
+            "payloads": [item["payload"] for item in items],
+        }
+    ).encode()
+    vectors = b"".join(item["vector"] for item in items)
+    return struct.pack("<I", len(header)) + header + vectors
+
+
+def mmr_rerank(vectors: np.ndarray, query: np.ndarray, k: int, lam: float) -> list[int]:
+    """Greedy maximal marginal relevance over `vectors`, returning the indices
+    of up to `k` picks in selection order.
+
+    Each candidate's highest similarity to the picks so far is kept in
+    `max_sim` and refreshed with one matrix-vector product per pick, so the
+    selection is O(n·k) dot products instead of O(n·k²).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) == 0:
+        return []
+    vectors = vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+    query = np.asarray(query, dtype=np.float32)
+    relevance = vectors @ (query / (np.linalg.norm(query) + 1e-12))
+
+    selected = [int(relevance.argmax())]
+    max_sim = vectors @ vectors[selected[0]]
+    for _ in range(min(k, len(vectors)) - 1):
+        score = lam * relevance - (1 - lam) * max_sim
+        score[selected] = -np.inf
+        i = int(score.argmax())
+        selected.append(i)
+        np.maximum(max_sim, vectors @ vectors[i], out=max_sim)
+    return selected
+
+
+def point_vector(point) -> list:
+    # Single unnamed vector per shard, but tolerate the named-vector form
+    vector = point.vector
+    if isinstance(vector, dict):
+        vector = vector.get("") or next(iter(vector.values()))
+    return vector
+
 
 class VisionStorage:
     def __init__(self, data_dir: Path):
@@ -53,6 +145,36 @@ class VisionStorage:
         self.upload_queue = None
         self.worker_thread = None
         self.is_running = False
+        self._stopped = threading.Event()
+        # Set while synced points are still being deleted from the mutable shard
+        self._cleanup_cutoff = None
+        self._gc_thread = None
+        # In-flight searches per immutable shard handle, so a replaced shard is
+        # only closed and deleted once nothing is querying it
+        self._shard_readers = Counter()
+        self._shard_released = threading.Condition()
+        # Shard queries run in native code, so both shards can be searched at once
+        self._query_pool = ThreadPoolExecutor(max_workers=2)
+        # One pooled session keeps connections to the backend alive across batches
+        self._http = requests.Session()
+        self._http.headers.update(HEADERS)
+        self._http.mount("http://", self._http_adapter(Retry.DEFAULT_ALLOWED_METHODS))
+        # Upserts carry their point ids, so unlike snapshot creation they are
+        # safe to retry as POSTs
+        self._http.mount(f"{BACKEND_URL}{UPSERT_ENDPOINT}", self._http_adapter(None))
+
+    @staticmethod
+    def _http_adapter(retry_methods) -> HTTPAdapter:
+        return HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=retry_methods,
+            ),
+        )
 
     @property
     def mutable_dir(self) -> Path:
@@ -63,9 +185,17 @@ class VisionStorage:
         return self.data_dir / IMMUTABLE_SHARD_DIR
 
     def initialize(self):
-        self.data_dir.mkdir(parents=True, exist_ok=True)
+        if not self.data_dir.exists():
+            # Fresh edge storage: whatever an earlier run uploaded is stale.
+            # The marker survives restarts until the server has been cleared.
+            self.data_dir.mkdir(parents=True)
+            (self.data_dir / SERVER_RESET_MARKER).touch()
         self.mutable_dir.mkdir(parents=True, exist_ok=True)
 
+        # Replaced shards whose background deletion didn't finish before exit
+        for leftover in self.data_dir.glob(f"{RETIRED_SHARD_PREFIX}*"):
+            shutil.rmtree(leftover, ignore_errors=True)
+
         self.mutable_shard = EdgeShard(str(self.mutable_dir), SHARD_CONFIG)
 
         if self.immutable_dir.exists():
@@ -77,160 +207,367 @@ class VisionStorage:
     def _start_sync_worker(self):
         self.worker_thread = threading.Thread(target=self._sync_worker, daemon=True)
         self.is_running = True
+        self._stopped.clear()
+        self.upload_queue.resume()
         self.worker_thread.start()
 
-    def _upload_batch(self, items: list) -> bool:
+    def _reset_server_if_pending(self):
+        marker = self.data_dir / SERVER_RESET_MARKER
+        if marker.exists():
+            self._http.post(f"{BACKEND_URL}/api/reset").raise_for_status()
+            marker.unlink()
+
+    def _upload_batch(self, entries: list) -> bool:
+        row_ids = [row_id for row_id, _ in entries]
         try:
-            resp = requests.post(
-                f"{BACKEND_URL}/api/upsert",
-                json=items,
-                headers=HEADERS,
+            self._reset_server_if_pending()
+            resp = self._http.post(
+                f"{BACKEND_URL}{UPSERT_ENDPOINT}",
+                data=encode_batch([item for _, item in entries]),
+                headers={"Content-Type": "application/octet-stream"},
             )
             resp.raise_for_status()
-            for item in items:
-                self.upload_queue.ack(item)
+            self.upload_queue.ack_many(row_ids)
             return True
         except requests.RequestException:
-            for item in items:
-                self.upload_queue.nack(item)
+            self.upload_queue.nack_many(row_ids)
             return False
 
+    def _drain_queue(self, timeout: float | None = None) -> list:
+        """Wait up to `timeout` for the first item (don't wait if None), then
+        take whatever else is already queued, up to UPLOAD_BATCH_SIZE, as
+        (row id, item) pairs."""
+        return self.upload_queue.get_many(
+            UPLOAD_BATCH_SIZE, block=timeout is not None, timeout=timeout
+        )
+
     def _sync_worker(self):
         while self.is_running:
-            items = []
-            while self.upload_queue.size > 0:
-                items.append(self.upload_queue.get(block=False))
-
-            if items:
-                self._upload_batch(items)
-
-            time.sleep(SYNC_INTERVAL)
+            entries = self._drain_queue(timeout=SYNC_INTERVAL)
+            if entries and not self._upload_batch(entries):
+                # Back off instead of retrying an unreachable server in a loop
+                self._stopped.wait(SYNC_INTERVAL)
 
     def force_sync(self):
-        items = []
-        while self.upload_queue.size > 0:
-            items.append(self.upload_queue.get(block=False))
-        if items:
-            self._upload_batch(items)
+        # Don't let a sync download points from before the edge was wiped
+        self._reset_server_if_pending()
+        while True:
+            entries = self._drain_queue()
+            if not entries or not self._upload_batch(entries):
+                break
 
     def stop_sync_worker(self):
         self.is_running = False
+        self._stopped.set()
+        # The worker may be waiting on the queue for new items, not on _stopped
+        self.upload_queue.interrupt()
         if self.worker_thread:
             self.worker_thread.join()
 
-    def store_image(self, image_path, embedding) -> str:
-        image_id = str(uuid.uuid4())
-        payload = {IMAGE_PATH_KEY: str(image_path), SYNC_TIMESTAMP_KEY: time.time()}
-        vector = embedding.tolist()
-
-        self.mutable_shard.update(
-            UpdateOperation.upsert_points(
-                [Point(id=image_id, vector=vector, payload=payload)]
-            )
-        )
-        self.upload_queue.put({"id": image_id, "vector": vector, "payload": payload})
-        return image_id
+    def close(self):
+        self.stop_sync_worker()
+        self._query_pool.shutdown()
+        self._http.close()
+
+    def store_image(self, image_path, embedding, *, timestamp: float | None = None) -> int:
+        return self.store_images([image_path], [embedding], timestamp=timestamp)[0]
+
+    def store_images(
+        self, image_paths: list, embeddings: list, *, timestamp: float | None = None
+    ) -> list[int]:
+        """Store a batch with one shard update and one queue transaction.
+        All points share one `timestamp`, taken now if not given."""
+        if timestamp is None:
+            timestamp = time.time()
+        points, items = [], []
+        for image_path, embedding in zip(image_paths, embeddings):
+            # Random unsigned 64-bit id: Qdrant's native integer id type, far
+            # cheaper to encode, send and hash than a 36-character UUID string
+            image_id = uuid.uuid4().int >> 64
+            payload = {IMAGE_PATH_KEY: str(image_path), SYNC_TIMESTAMP_KEY: timestamp}
+            # Quantize from native float32; the shard is the only consumer of a list
+            embedding, vector = prepare_vector(embedding)
+
+            points.append(Point(id=image_id, vector=vector, payload=payload))
+            items.append({"id": image_id, **quantize_vector(embedding), "payload": payload})
+
+        self.mutable_shard.update(UpdateOperation.upsert_points(points))
+        self.upload_queue.put_many(items)
+        return [item["id"] for item in items]
 
     def search_similar(self, query_embedding, limit: int = SEARCH_LIMIT):
-        query = QueryRequest(
-            prefetches=[],
-            query=Mmr(
-                # Using dict comprehension because "lambda" is a reserved keyword in Python
-                **{
-                    "vector": query_embedding.tolist(),
-                    "lambda": MMR_DIVERSITY_FACTOR,
-                    "candidates_limit": MMR_MAX_CANDIDATES,
-                },
+        query_embedding, vector = prepare_vector(query_embedding)
+
+        # Small result sets don't need the full candidate pool for diversity
+        candidates_limit = min(MMR_MAX_CANDIDATES, max(64, limit * MMR_OVERFETCH))
+
+        # The mutable shard only holds frames since the last sync, so plain
+        # nearest neighbours are cheap there; they are fetched as a full
+        # candidate pool and diversified by the rerank below
+        cutoff = self._cleanup_cutoff
+        mutable_future = self._query_pool.submit(
+            self.mutable_shard.query,
+            QueryRequest(
+                prefetches=[],
+                query=Query.Nearest(vector),
+                # Points up to the cutoff are in the immutable shard already
+                filter=self._synced_filter(cutoff, must_not=True) if cutoff else None,
+                limit=candidates_limit,
+                with_payload=True,
+                with_vector=True,
             ),
-            limit=limit,
-            with_payload=True,
         )
 
-        results = self.mutable_shard.query(query)
-        if self.immutable_shard:
-            results.extend(self.immutable_shard.query(query))
-
-        results.sort(key=lambda x: x.score, reverse=True)
+        results = []
+        with self._immutable_reader() as immutable_shard:
+            if immutable_shard:
+                mmr_query = QueryRequest(
+                    prefetches=[],
+                    query=Mmr(
+                        # Using dict comprehension because "lambda" is a reserved keyword in Python
+                        **{
+                            "vector": vector,
+                            "lambda": MMR_DIVERSITY_FACTOR,
+                            "candidates_limit": candidates_limit,
+                        },
+                    ),
+                    limit=limit,
+                    with_payload=True,
+                    with_vector=True,
+                )
+                results.extend(immutable_shard.query(mmr_query))
+        results.extend(mutable_future.result())
 
-        seen, unique = set(), []
+        # A point can be in both shards until the mutable copy is cleaned up
+        best = {}
         for r in results:
-            if r.id not in seen:
-                seen.add(r.id)
-                unique.append(
-                    {
-                        "id": r.id,
-                        "score": r.score,
-                        IMAGE_PATH_KEY: r.payload[IMAGE_PATH_KEY],
-                    }
-                )
-        return unique[:limit]
+            if r.id not in best or r.score > best[r.id].score:
+                best[r.id] = r
+
+        # The mutable shard's hits are plain nearest neighbours, and before the
+        # first full sync they are all there is, so diversify the merged list
+        candidates = list(best.values())
+        order = mmr_rerank(
+            [point_vector(r) for r in candidates],
+            query_embedding,
+            limit,
+            MMR_DIVERSITY_FACTOR,
+        )
+        top = [candidates[i] for i in order]
+        return [
+            {
+                "id": r.id,
+                "score": r.score,
+                IMAGE_PATH_KEY: r.payload[IMAGE_PATH_KEY],
+            }
+            for r in top
+        ]
+
+    @contextmanager
+    def _immutable_reader(self):
+        with self._shard_released:
+            shard = self.immutable_shard
+            self._shard_readers[id(shard)] += 1
+        try:
+            yield shard
+        finally:
+            with self._shard_released:
+                self._shard_readers[id(shard)] -= 1
+                self._shard_released.notify_all()
+
+    def _retire_shard(self, shard, shard_dir: Path):
+        """Close a replaced immutable shard once its searches have finished,
+        then delete its files."""
+        try:
+            with self._shard_released:
+                self._shard_released.wait_for(lambda: self._shard_readers[id(shard)] == 0)
+                del self._shard_readers[id(shard)]
+            shard.close()
+        except Exception:
+            logger.exception("Closing the replaced immutable shard failed")
+        finally:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+
+    def _swap_immutable_shard(self, unpacked_dir: Path):
+        """Move a freshly unpacked shard into place with two renames. Searches
+        keep using the old handle (its open files survive the move) until the
+        new shard is open; the old one is retired in the background."""
+        old_dir = Path(tempfile.mkdtemp(prefix=RETIRED_SHARD_PREFIX, dir=self.data_dir))
+        moved_old = moved_new = False
+        try:
+            if self.immutable_dir.exists():
+                os.replace(self.immutable_dir, old_dir / "shard")
+                moved_old = True
+            os.replace(unpacked_dir, self.immutable_dir)
+            moved_new = True
+            new_shard = EdgeShard(str(self.immutable_dir), None)
+        except Exception:
+            # Undo the renames that happened, putting the previous shard back
+            # where its handle expects it
+            if moved_new:
+                os.replace(self.immutable_dir, unpacked_dir)
+            if moved_old:
+                os.replace(old_dir / "shard", self.immutable_dir)
+            old_dir.rmdir()
+            raise
+
+        with self._shard_released:
+            old_shard, self.immutable_shard = self.immutable_shard, new_shard
+        if old_shard is None:
+            old_dir.rmdir()
+            return
+        threading.Thread(
+            target=self._retire_shard, args=(old_shard, old_dir), daemon=True
+        ).start()
 
     def _download_snapshot(
-        self, endpoint: str, target_path: Path, json_data: dict = None
+        self, endpoint: str, target_path: Path, json_data: dict = None, method: str = "POST"
     ):
-        resp = requests.post(
+        with self._http.request(
+            method,
             f"{BACKEND_URL}{endpoint}",
             json=json_data,
-            headers=HEADERS,
+            # Snapshots are already compressed archives
+            headers={"Accept-Encoding": "identity"},
             stream=True,
-        )
-        resp.raise_for_status()
+        ) as resp:
+            resp.raise_for_status()
+            resp.raw.decode_content = False
+            with open(target_path, "wb") as f:
+                shutil.copyfileobj(resp.raw, f, length=SNAPSHOT_CHUNK_SIZE)
+
+    def _download_parallel(
+        self, endpoint: str, target_path: Path, workers: int = SNAPSHOT_DOWNLOAD_WORKERS
+    ):
+        """Download a snapshot as concurrent byte ranges written into a
+        pre-sized file, or as one stream if the server ignores Range."""
+        url = f"{BACKEND_URL}{endpoint}"
+        identity = {"Accept-Encoding": "identity"}
+
+        # A one-byte probe: 206 tells us the total size, 200 is the whole file
+        with self._http.get(
+            url, headers={**identity, "Range": "bytes=0-0"}, stream=True
+        ) as probe:
+            probe.raise_for_status()
+            if probe.status_code != 206:
+                probe.raw.decode_content = False
+                with open(target_path, "wb") as f:
+                    shutil.copyfileobj(probe.raw, f, length=SNAPSHOT_CHUNK_SIZE)
+                return
+            size = int(probe.headers["Content-Range"].rsplit("/", 1)[1])
+
         with open(target_path, "wb") as f:
-            for chunk in resp.iter_content(chunk_size=SNAPSHOT_CHUNK_SIZE):
-                f.write(chunk)
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, size)
+            else:
+                f.truncate(size)
+
+        part = max(SNAPSHOT_CHUNK_SIZE, -(-size // workers))
+        ranges = [(lo, min(lo + part, size) - 1) for lo in range(0, size, part)]
+
+        def fetch(lo: int, hi: int):
+            with self._http.get(
+                url, headers={**identity, "Range": f"bytes={lo}-{hi}"}, stream=True
+            ) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise requests.HTTPError(f"Range {lo}-{hi} not honoured", response=r)
+                r.raw.decode_content = False
+                # Each range gets its own handle, so writes land at their own
+                # offset without sharing a file position (works without pwrite)
+                with open(target_path, "r+b") as f:
+                    f.seek(lo)
+                    shutil.copyfileobj(r.raw, f, length=SNAPSHOT_CHUNK_SIZE)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(fetch, lo, hi) for lo, hi in ranges]:
+                future.result()
+
+    def _restore_full_snapshot(self, temp_dir: Path, target_dir: Path):
+        # Create the snapshot once; a failed ranged download retries the same one
+        resp = self._http.post(f"{BACKEND_URL}{FULL_SNAPSHOT_ENDPOINT}/create")
+        resp.raise_for_status()
+        endpoint = f"{FULL_SNAPSHOT_ENDPOINT}/{resp.json()['name']}"
+
+        snapshot_path = temp_dir / "shard.snapshot"
+        try:
+            self._download_parallel(endpoint, snapshot_path)
+        # Bodies are copied from resp.raw, so mid-transfer resets and read
+        # timeouts surface as urllib3 errors that requests doesn't wrap
+        except (requests.RequestException, urllib3.exceptions.HTTPError):
+            logger.warning("Ranged snapshot download failed, retrying in one stream", exc_info=True)
+            self._download_snapshot(endpoint, snapshot_path, method="GET")
+
+        # No page cache eviction: unpacking reads the archive right away, and
+        # deleting the temp dir afterwards frees its pages anyway
+        EdgeShard.unpack_snapshot(str(snapshot_path), str(target_dir))
+
+    @staticmethod
+    def _synced_filter(sync_timestamp: float, must_not: bool = False) -> Filter:
+        condition = [
+            FieldCondition(key=SYNC_TIMESTAMP_KEY, range=RangeFloat(lte=sync_timestamp))
+        ]
+        return Filter(must_not=condition) if must_not else Filter(must=condition)
 
     def _cleanup_mutable_shard(self, sync_timestamp: float):
         self.mutable_shard.update(
-            UpdateOperation.delete_points_by_filter(
-                Filter(
-                    must=[
-                        FieldCondition(
-                            key=SYNC_TIMESTAMP_KEY, range=RangeFloat(lte=sync_timestamp)
-                        )
-                    ]
-                )
-            )
+            UpdateOperation.delete_points_by_filter(self._synced_filter(sync_timestamp))
         )
 
-    def sync_from_server(self):
-        self.stop_sync_worker()
-        self.force_sync()
+    def _start_cleanup(self, sync_timestamp: float):
+        """Delete synced points from the mutable shard in the background.
+        Searches hide them through `_cleanup_cutoff` until the delete is done."""
+        if self._gc_thread:
+            self._gc_thread.join()
+        self._cleanup_cutoff = sync_timestamp
+        self._gc_thread = threading.Thread(
+            target=self._run_cleanup, args=(sync_timestamp,), daemon=True
+        )
+        self._gc_thread.start()
 
+    def _run_cleanup(self, sync_timestamp: float):
+        try:
+            self._cleanup_mutable_shard(sync_timestamp)
+            self._cleanup_cutoff = None
+        except Exception:
+            # Keep filtering; the next sync deletes these points along with its own
+            logger.exception("Mutable shard cleanup failed")
+
+    def sync_from_server(self):
         if not self.immutable_shard:
             raise ValueError(
                 "Baseline for partial snapshots is not set. Run a full sync first."
             )
 
-        manifest = self.immutable_shard.snapshot_manifest()
-        sync_timestamp = time.time()
+        self.stop_sync_worker()
+        try:
+            self.force_sync()
 
-        with tempfile.TemporaryDirectory(dir=self.data_dir) as temp_dir:
-            snapshot_path = Path(temp_dir) / "partial.snapshot"
-            self._download_snapshot(
-                "/api/snapshots/partial", snapshot_path, {"manifest": manifest}
-            )
-            self.immutable_shard.update_from_snapshot(str(snapshot_path))
+            manifest = self.immutable_shard.snapshot_manifest()
+            sync_timestamp = time.time()
 
-        self._cleanup_mutable_shard(sync_timestamp)
-        self._start_sync_worker()
+            with tempfile.TemporaryDirectory(dir=self.data_dir) as temp_dir:
+                snapshot_path = Path(temp_dir) / "partial.snapshot"
+                self._download_snapshot(
+                    "/api/snapshots/partial", snapshot_path, {"manifest": manifest}
+                )
+                self.immutable_shard.update_from_snapshot(str(snapshot_path))
+        finally:
+            self._start_sync_worker()
+        self._start_cleanup(sync_timestamp)
 
     def full_sync_from_server(self):
         self.stop_sync_worker()
-        self.force_sync()
-
-        sync_timestamp = time.time()
-
-        with tempfile.TemporaryDirectory(dir=self.data_dir) as temp_dir:
-            snapshot_path = Path(temp_dir) / "shard.snapshot"
-            self._download_snapshot("/api/snapshots/full", snapshot_path)
-
-            self.immutable_shard = None
-            if self.immutable_dir.exists():
-                shutil.rmtree(self.immutable_dir)
-            self.immutable_dir.mkdir(parents=True, exist_ok=True)
-
-            EdgeShard.unpack_snapshot(str(snapshot_path), str(self.immutable_dir))
-            self.immutable_shard = EdgeShard(str(self.immutable_dir), None)
-
-        self._cleanup_mutable_shard(sync_timestamp)
-        self._start_sync_worker()
+        try:
+            self.force_sync()
+
+            sync_timestamp = time.time()
+
+            with tempfile.TemporaryDirectory(dir=self.data_dir) as temp_dir:
+                unpacked_dir = Path(temp_dir) / "shard"
+                unpacked_dir.mkdir()
+                self._restore_full_snapshot(Path(temp_dir), unpacked_dir)
+                self._swap_immutable_shard(unpacked_dir)
+        finally:
+            self._start_sync_worker()
+        self._start_cleanup(sync_timestamp)
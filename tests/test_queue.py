@@ -0,0 +1,108 @@
+import threading
+import time
+
+from glasses_x_edge.queue import PersistentQueue
+
+WAIT = 5.0  # seconds; upper bound so a broken wakeup fails instead of hanging
+
+
+def items_of(entries):
+    return [item for _, item in entries]
+
+
+def test_nack_keeps_original_order(tmp_path):
+    queue = PersistentQueue(tmp_path)
+    queue.put_many(["a", "b", "c", "d"])
+
+    entries = queue.get_many(2)
+    assert items_of(entries) == ["a", "b"]
+    queue.nack_many([row_id for row_id, _ in entries])
+
+    assert items_of(queue.get_many(10)) == ["a", "b", "c", "d"]
+
+
+def test_repeated_nack_does_not_inflate_size(tmp_path):
+    queue = PersistentQueue(tmp_path)
+    queue.put_many([1, 2, 3])
+
+    row_ids = [row_id for row_id, _ in queue.get_many(2)]
+    assert queue.size == 1
+    queue.nack_many(row_ids)
+    queue.nack_many(row_ids)
+    queue.nack(row_ids[0])
+
+    assert queue.size == 3
+    assert items_of(queue.get_many(10)) == [1, 2, 3]
+
+
+def test_ack_removes_items(tmp_path):
+    queue = PersistentQueue(tmp_path)
+    queue.put_many([1, 2])
+
+    queue.ack_many([row_id for row_id, _ in queue.get_many(10)])
+
+    assert queue.size == 0
+    assert PersistentQueue(tmp_path).size == 0
+
+
+def test_unacked_items_are_redelivered_after_reopen(tmp_path):
+    queue = PersistentQueue(tmp_path)
+    queue.put_many(["a", "b", "c"])
+    row_id, _ = queue.get()
+    queue.ack(row_id)
+    queue.get_many(10)  # taken but never acked, as if the process died mid-upload
+    queue._conn.close()
+
+    reopened = PersistentQueue(tmp_path)
+
+    assert reopened.size == 2
+    assert items_of(reopened.get_many(10)) == ["b", "c"]
+
+
+def blocked_get_many(queue):
+    result = []
+    consumer = threading.Thread(target=lambda: result.append(queue.get_many(10, timeout=WAIT)))
+    consumer.start()
+    time.sleep(0.1)  # let the consumer start waiting
+    return consumer, result
+
+
+def test_blocked_get_many_wakes_on_put(tmp_path):
+    queue = PersistentQueue(tmp_path)
+    consumer, result = blocked_get_many(queue)
+
+    started = time.monotonic()
+    queue.put("x")
+    consumer.join(WAIT)
+
+    assert time.monotonic() - started < 1.0
+    assert items_of(result[0]) == ["x"]
+
+
+def test_blocked_get_many_wakes_on_interrupt(tmp_path):
+    queue = PersistentQueue(tmp_path)
+    consumer, result = blocked_get_many(queue)
+
+    started = time.monotonic()
+    queue.interrupt()
+    consumer.join(WAIT)
+
+    assert time.monotonic() - started < 1.0
+    assert result == [[]]
+
+
+def test_interrupt_still_hands_out_queued_items_until_resume(tmp_path):
+    queue = PersistentQueue(tmp_path)
+    queue.interrupt()
+    queue.put("x")
+
+    assert items_of(queue.get_many(10, timeout=WAIT)) == ["x"]
+
+    started = time.monotonic()
+    assert queue.get_many(10, timeout=WAIT) == []
+    assert time.monotonic() - started < 1.0
+
+    queue.resume()
+    started = time.monotonic()
+    assert queue.get_many(10, timeout=0.2) == []
+    assert time.monotonic() - started >= 0.2